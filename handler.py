@@ -1,40 +1,73 @@
 import json
 import os
 import logging
+import concurrent.futures
+import functools
+import threading
+from collections import namedtuple
 import africastalking
-from urllib.parse import parse_qs
+from urllib.parse import unquote_plus
 import boto3
+from botocore.config import Config
 
 # Initialize logger
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 # Initialize AWS DynamoDB client
-dynamodb = boto3.resource('dynamodb')
+# Created at module scope with TCP keep-alive so the pooled HTTPS connection
+# is reused across warm Lambda invocations instead of re-handshaking each turn.
+# A Lambda container serves one request at a time, so a small pool is enough,
+# and tight timeouts with few standard-mode retries fail fast rather than
+# outlasting the Africa's Talking webhook timeout.
+boto_config = Config(
+    tcp_keepalive=True,
+    connect_timeout=1.0,
+    read_timeout=2.0,
+    retries={'max_attempts': 2, 'mode': 'standard'},
+    max_pool_connections=2
+)
+# Low-level client rather than the Table resource: our items are flat, so
+# building typed attribute values by hand skips the Decimal (de)serializer.
+dynamo_client = boto3.client('dynamodb', config=boto_config)
 users_table_name = os.environ.get('USERS_TABLE')
 if not users_table_name:
     logger.error("USERS_TABLE environment variable not set. DynamoDB operations will fail.")
-    users_table = None
 else:
-    users_table = dynamodb.Table(users_table_name)
-    logger.info(f"DynamoDB table '{users_table_name}' initialized.")
+    logger.info("DynamoDB table '%s' initialized.", users_table_name)
 
+# Shared worker pool so the SMS send can run in the background while the
+# DynamoDB write happens. Kept at module scope so its threads are reused
+# across warm invocations.
+EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+SMS_SEND_TIMEOUT = 2 # Seconds to wait for an in-flight SMS before returning
 
-# Initialize Africa's Talking SDK
+
+# Africa's Talking SDK, initialized lazily on the first reply so cold starts
+# that never send an SMS don't pay for it
 AT_USERNAME = os.environ.get('AFRICASTALKING_USERNAME')
 AT_API_KEY = os.environ.get('AFRICASTALKING_API_KEY')
 
-if AT_USERNAME and AT_API_KEY:
-    try:
-        africastalking.initialize(AT_USERNAME, AT_API_KEY)
-        sms_service = africastalking.SMS
-        logger.info("Africa's Talking SDK initialized successfully.")
-    except Exception as e:
-        logger.error(f"Error initializing Africa's Talking SDK: {e}")
-        sms_service = None
-else:
-    logger.warning("AFRICASTALKING_USERNAME or AFRICASTALKING_API_KEY not set. Cannot send SMS.")
-    sms_service = None
+_sms_lock = threading.Lock()
+_sms_service = None
+_sms_initialized = False
+
+def _get_sms():
+    global _sms_service, _sms_initialized
+    if not _sms_initialized:
+        with _sms_lock:
+            if not _sms_initialized:
+                if AT_USERNAME and AT_API_KEY:
+                    try:
+                        africastalking.initialize(AT_USERNAME, AT_API_KEY)
+                        _sms_service = africastalking.SMS
+                        logger.info("Africa's Talking SDK initialized successfully.")
+                    except Exception as e:
+                        logger.error("Error initializing Africa's Talking SDK: %s", e)
+                else:
+                    logger.warning("AFRICASTALKING_USERNAME or AFRICASTALKING_API_KEY not set. Cannot send SMS.")
+                _sms_initialized = True
+    return _sms_service
 
 # --- GAME DATA DEFINITIONS (KEEP AS IS) ---
 GAME_DATA = {
@@ -105,6 +138,21 @@ GAME_DATA = {
     "default_death": "You made a fatal error. Your hustle ended here. 💀 Reply RESTART to start again."
 }
 
+# Rendered question prompts (message + options), built once at import
+PROMPTS = {
+    k: v["message"] + "\n" + "\n".join(v["options"])
+    for k, v in GAME_DATA.items() if isinstance(v, dict) and "options" in v
+}
+# Re-prompts for bad input on a question, also rendered once per state
+INVALID_PROMPTS = {
+    k: "Invalid choice. Please reply with 1, 2, or 3.\n" + "\n".join(v["options"])
+    for k, v in GAME_DATA.items() if isinstance(v, dict) and v.get("options")
+}
+UNKNOWN_INPUT_PROMPTS = {
+    k: "I don't understand that. Please choose an option (1, 2, 3) or reply RESTART.\n" + "\n".join(v["options"])
+    for k, v in GAME_DATA.items() if isinstance(v, dict) and v.get("options")
+}
+
 RANDOM_EVENTS = {
     "ghosted": {
         "message": "Oh no! Your cousin ghosted you! That KES 2000 is gone forever. (-KES 2000)",
@@ -135,115 +183,255 @@ RANDOM_EVENTS = {
 
 HUSTLE_GOAL = 10000
 
-# Helper function to send SMS reply
+# Accepted inputs, as frozensets for O(1) membership checks
+_VALID_CHOICES = frozenset(("1", "2", "3"))
+_GAME_START_TOKENS = frozenset(("1", "CHOOSE YOUR HUSTLE", "HUSTLE"))
+_GAME2_TOKENS = frozenset(("2", "PICK UP OR PERISH", "PERISH"))
+
+# Game menu replies
+_GAME_MENU = "What game do you want to play?\n1. Choose Your Hustle\n2. Pick Up or Perish"
+_WELCOME_MSG = "Welcome! " + _GAME_MENU
+_RESTART_MSG = "Welcome back! " + _GAME_MENU
+
+# --- COMPILED GAME DATA ---
+# GAME_DATA and RANDOM_EVENTS are compiled once at import into namedtuples so
+# the hot path uses attribute access instead of nested dict lookups.
+Outcome = namedtuple('Outcome', 'message next_state net_worth_delta net_worth_pct is_death random_event')
+StateRec = namedtuple('StateRec', 'prompt options next_state outcomes')
+
+def _compile_outcome(data):
+    effect = data["effect"]
+    net_worth = effect.get("net_worth")
+    net_worth_pct = effect.get("net_worth_percentage")
+    random_event = None
+    random_event_data = RANDOM_EVENTS.get(effect.get("random_event"))
+    if random_event_data is not None:
+        random_event = _compile_outcome(random_event_data)
+    return Outcome(
+        message=data["message"],
+        next_state=data.get("next_state"),
+        net_worth_delta=None if net_worth == "die" else net_worth,
+        net_worth_pct=net_worth_pct,
+        is_death=net_worth == "die",
+        random_event=random_event
+    )
+
+def _compile_game_data():
+    compiled = {}
+    for state_key, data in GAME_DATA.items():
+        if not isinstance(data, dict):
+            continue # Plain message strings (death/win) are read from GAME_DATA directly
+        outcomes = None
+        if "outcomes" in data:
+            outcomes = {opt: _compile_outcome(o) for opt, o in data["outcomes"].items()}
+        compiled[state_key] = StateRec(
+            prompt=PROMPTS.get(state_key),
+            options=tuple(data.get("options", ())),
+            next_state=data.get("next_state"),
+            outcomes=outcomes
+        )
+    return compiled
+
+COMPILED = _compile_game_data()
+
+# Flat (state, choice) -> Outcome table so a game move is a single lookup
+OUTCOME_TABLE = {
+    (state_key, opt): outcome
+    for state_key, rec in COMPILED.items() if rec.outcomes
+    for opt, outcome in rec.outcomes.items()
+}
+
+# Helper functions to send SMS reply
+@functools.lru_cache(maxsize=1024)
+def _recip(recipient_number):
+    # One immutable recipients sequence per phone number for the container's lifetime
+    return (recipient_number,)
+
+def _send_sms(sms_instance, recipient_number, message_text):
+    try:
+        logger.info("*** SIMULATED SMS TO %s: ***\n%s\n***********************************", recipient_number, message_text)
+        # Use the original recipient_number (with '+') for Africa's Talking
+        response = sms_instance.send(message_text, _recip(recipient_number))
+        logger.info("SMS sent successfully to %s: %s", recipient_number, response)
+    except Exception as e:
+        logger.error("Failed to send SMS to %s: %s", recipient_number, e)
+
 def send_sms_reply(sms_instance, recipient_number, message_text):
+    # Sends on the background executor and returns the Future (None if the SDK is unavailable)
     if sms_instance:
-        try:
-            logger.info(f"*** SIMULATED SMS TO {recipient_number}: ***\n{message_text}\n***********************************")
-            # Use the original recipient_number (with '+') for Africa's Talking
-            response = sms_instance.send(message_text, [recipient_number])
-            logger.info(f"SMS sent successfully to {recipient_number}: {response}")
-        except Exception as e:
-            logger.error(f"Failed to send SMS to {recipient_number}: {e}")
-    else:
-        logger.error("Africa's Talking SDK not initialized. Cannot send reply.")
+        return EXECUTOR.submit(_send_sms, sms_instance, recipient_number, message_text)
+    logger.error("Africa's Talking SDK not initialized. Cannot send reply.")
+    return None
+
+def wait_for_sms(send_future):
+    # Lambda freezes the container once the handler returns, so let the send finish first
+    if send_future is not None:
+        concurrent.futures.wait([send_future], timeout=SMS_SEND_TIMEOUT)
 
 # --- DynamoDB Helper Functions ---
 def get_user_state(db_phone_number): # Changed argument name to avoid confusion
-    if not users_table:
+    if not users_table_name:
         logger.error("DynamoDB table not initialized.")
         return None
     try:
-        response = users_table.get_item(Key={'phoneNumber': db_phone_number})
+        response = dynamo_client.get_item(TableName=users_table_name, Key={'phoneNumber': {'S': db_phone_number}})
         item = response.get('Item')
         if item:
-            # DynamoDB stores numbers as Decimal, convert to int/float
-            for key in ['net_worth', 'days_survived']:
-                if key in item:
-                    item[key] = int(item[key]) # Convert Decimal to int
-            
-            # Convert empty strings from DB to None for game state
-            if item.get('game') == '': item['game'] = None
-            if item.get('current_q') == '': item['current_q'] = None
-
-            return item
+            # All attributes are plain strings or integers
+            return {key: int(value['N']) if 'N' in value else value['S'] for key, value in item.items()}
         return None
     except Exception as e:
-        logger.error(f"Error getting user state for {db_phone_number}: {e}")
+        logger.error("Error getting user state for %s: %s", db_phone_number, e)
         return None
 
-def save_user_state(user_state):
-    if not users_table:
+def update_user_state(db_phone_number, user_state):
+    if not users_table_name:
         logger.error("DynamoDB table not initialized. Cannot save state.")
         return False
     try:
-        # DynamoDB doesn't like None for string attributes, use empty string instead
-        item_to_save = user_state.copy()
-        if item_to_save.get('game') is None: item_to_save['game'] = ''
-        if item_to_save.get('current_q') is None: item_to_save['current_q'] = ''
+        # Single UpdateItem round-trip; creates the item for new users.
+        # "No game" is stored as an empty string throughout, never None
+        dynamo_client.update_item(
+            TableName=users_table_name,
+            Key={'phoneNumber': {'S': db_phone_number}},
+            UpdateExpression='SET net_worth = :nw, days_survived = :d, current_q = :q, game = :g, #s = :st',
+            ExpressionAttributeNames={'#s': 'status'},
+            ExpressionAttributeValues={
+                ':nw': {'N': str(user_state['net_worth'])},
+                ':d': {'N': str(user_state['days_survived'])},
+                ':q': {'S': user_state['current_q']},
+                ':g': {'S': user_state['game']},
+                ':st': {'S': user_state['status']}
+            }
+        )
+        logger.info("User state saved for %s", db_phone_number)
+        return True
+    except Exception as e:
+        logger.error("Error saving user state for %s: %s", db_phone_number, e)
+        return False
 
-        users_table.put_item(Item=item_to_save)
-        logger.info(f"User state saved for {user_state['phoneNumber']}")
+def reset_user_state(db_phone_number):
+    if not users_table_name:
+        logger.error("DynamoDB table not initialized. Cannot reset state.")
+        return False
+    try:
+        # Writes the fresh-player attributes directly; no state dict is needed
+        dynamo_client.update_item(
+            TableName=users_table_name,
+            Key={'phoneNumber': {'S': db_phone_number}},
+            UpdateExpression='SET game = :e, #s = :a, net_worth = :z, days_survived = :z, current_q = :e',
+            ExpressionAttributeNames={'#s': 'status'},
+            ExpressionAttributeValues={':e': {'S': ''}, ':a': {'S': 'alive'}, ':z': {'N': '0'}}
+        )
+        logger.info("User state reset for %s", db_phone_number)
         return True
     except Exception as e:
-        logger.error(f"Error saving user state for {user_state['phoneNumber']}: {e}")
+        logger.error("Error resetting user state for %s: %s", db_phone_number, e)
         return False
 
+def save_state_and_reply(db_phone_number, user_state, recipient_number, message_text):
+    # The write and the SMS are independent I/O, so save while the send is in flight
+    send_future = send_sms_reply(_get_sms(), recipient_number, message_text)
+    update_user_state(db_phone_number, user_state)
+    wait_for_sms(send_future)
+
+# --- Webhook Parsing ---
+def _fast_parse(raw_body):
+    # Single pass over the form body, decoding only the three fields we use.
+    # Like parse_qs, the first non-blank occurrence of a field wins.
+    from_number = text = link_id = None
+    for pair in raw_body.split('&'):
+        if not pair.startswith(('from=', 'text=', 'linkId=')):
+            continue
+        key, _, value = pair.partition('=')
+        if not value:
+            continue
+        if key == 'from':
+            if from_number is None: from_number = unquote_plus(value)
+        elif key == 'text':
+            if text is None: text = unquote_plus(value)
+        elif link_id is None:
+            link_id = unquote_plus(value)
+    return from_number, text, link_id
+
+@functools.lru_cache(maxsize=256)
+def _parse_body(raw_body):
+    # Cached on the raw body so Africa's Talking retries of the same webhook skip re-parsing
+    from_number, text, link_id = _fast_parse(raw_body)
+    return from_number, (text or '').strip().upper(), link_id
+
 # --- NEW HELPER FUNCTION for applying outcomes and getting message ---
 def apply_outcome_and_get_message(outcome, user_state):
-    reply_msg = outcome["message"]
-    next_q_key_after_outcome = outcome.get("next_state")
+    # Reply lines are collected and joined once at the end
+    parts = [outcome.message]
+    next_q_key_after_outcome = outcome.next_state
 
     # Apply effects (net_worth change or 'die' command)
-    if "net_worth" in outcome["effect"]:
-        if outcome["effect"]["net_worth"] == "die":
-            reply_msg = GAME_DATA["default_death"]
-            user_state["status"] = "dead"
-            user_state["game"] = None
-            user_state["current_q"] = None
-        else:
-            user_state["net_worth"] += outcome["effect"]["net_worth"]
-    elif "net_worth_percentage" in outcome["effect"]:
-        user_state["net_worth"] += int(user_state["net_worth"] * outcome["effect"]["net_worth_percentage"])
+    if outcome.is_death:
+        parts = [GAME_DATA["default_death"]]
+        user_state["status"] = "dead"
+        user_state["game"] = ""
+        user_state["current_q"] = ""
+    elif outcome.net_worth_delta is not None:
+        user_state["net_worth"] += outcome.net_worth_delta
+    elif outcome.net_worth_pct is not None:
+        user_state["net_worth"] += int(user_state["net_worth"] * outcome.net_worth_pct)
 
     # Handle random events
-    if "random_event" in outcome["effect"]:
-        event_key = outcome["effect"]["random_event"]
-        if event_key in RANDOM_EVENTS:
-            random_event_data = RANDOM_EVENTS[event_key]
-            reply_msg += f"\n{random_event_data['message']}"
-            if "net_worth" in random_event_data["effect"]:
-                if random_event_data["effect"]["net_worth"] == "die":
-                    reply_msg = GAME_DATA["default_death"]
-                    user_state["status"] = "dead"
-                    user_state["game"] = None
-                    user_state["current_q"] = None
-                else:
-                    user_state["net_worth"] += random_event_data["effect"]["net_worth"]
-            elif "net_worth_percentage" in random_event_data["effect"]:
-                user_state["net_worth"] += int(user_state["net_worth"] * random_event_data["effect"]["net_worth_percentage"])
-            
-            # Random events can override next state
-            next_q_key_after_outcome = random_event_data.get("next_state", next_q_key_after_outcome)
-    
+    random_event = outcome.random_event
+    if random_event is not None:
+        parts.append(random_event.message)
+        if random_event.is_death:
+            parts = [GAME_DATA["default_death"]]
+            user_state["status"] = "dead"
+            user_state["game"] = ""
+            user_state["current_q"] = ""
+        elif random_event.net_worth_delta is not None:
+            user_state["net_worth"] += random_event.net_worth_delta
+        elif random_event.net_worth_pct is not None:
+            user_state["net_worth"] += int(user_state["net_worth"] * random_event.net_worth_pct)
+
+        # Random events can override next state
+        next_q_key_after_outcome = random_event.next_state
+
     # Ensure net worth doesn't go negative if not a death state
     if user_state["status"] == "alive" and user_state["net_worth"] < 0:
         user_state["net_worth"] = 0
 
     # Check for WIN condition
     if user_state["status"] == "alive" and user_state["net_worth"] >= HUSTLE_GOAL:
-        reply_msg += f"\n{GAME_DATA['win_hustle']}\nCurrent Net Worth: KES {user_state['net_worth']}"
+        parts.append(GAME_DATA['win_hustle'])
+        parts.append(f"Current Net Worth: KES {user_state['net_worth']}")
         user_state["status"] = "dead"
-        user_state["game"] = None
-        user_state["current_q"] = None
+        user_state["game"] = ""
+        user_state["current_q"] = ""
     elif user_state["status"] == "alive": # If still alive, set next question
         user_state["current_q"] = next_q_key_after_outcome if next_q_key_after_outcome else "hustle_intro" # Default to intro if no specific next state
     
-    return reply_msg, user_state
+    return "\n".join(parts), user_state
+
+# After applying an outcome, prepare the message for the *new* current_q
+def _append_next_prompt(reply, state):
+    if state["status"] != "alive":
+        return reply
+    next_key = state["current_q"]
+    prompt = PROMPTS.get(next_key)
+    if prompt:
+        return "\n".join([reply, "", f"Current Net Worth: KES {state['net_worth']}", prompt])
+    if next_key == "check_win":
+        # Win condition already handled within apply_outcome_and_get_message if net_worth >= GOAL
+        return reply
+    # Unexpected end of flow (e.g., ran out of questions without explicit win/loss)
+    state["status"] = "dead"
+    state["game"] = ""
+    state["current_q"] = ""
+    return reply + "\nUnexpected game end. Reply RESTART to start again."
 
 
 def inbound_sms_handler(event, context):
-    logger.info(f"Received event: {json.dumps(event)}")
+    # json.dumps is only worth paying for when INFO is actually emitted
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("Received event: %s", json.dumps(event))
 
     # Store the original `from` number (with '+')
     original_from_number = None
@@ -253,10 +441,7 @@ def inbound_sms_handler(event, context):
 
     try:
         if isinstance(event.get('body'), str):
-            body_params = parse_qs(event['body'])
-            original_from_number = body_params.get('from', [None])[0]
-            text_message = body_params.get('text', [None])[0].strip().upper()
-            link_id = body_params.get('linkId', [None])[0]
+            original_from_number, text_message, link_id = _parse_body(event['body'])
         else:
             original_from_number = event.get('from')
             text_message = event.get('text').strip().upper()
@@ -267,7 +452,7 @@ def inbound_sms_handler(event, context):
             db_phone_number = original_from_number.replace('+', '')
 
     except Exception as e:
-        logger.error(f"Error parsing incoming SMS webhook body: {e}")
+        logger.error("Error parsing incoming SMS webhook body: %s", e)
         return {
             'statusCode': 400,
             'body': json.dumps({'message': 'Bad Request: Could not parse SMS body'})
@@ -280,9 +465,19 @@ def inbound_sms_handler(event, context):
             'body': json.dumps({'message': 'Bad Request: Missing SMS parameters'})
         }
 
-    logger.info(f"Incoming SMS from: {original_from_number}, Message: {text_message}")
+    logger.info("Incoming SMS from: %s, Message: %s", original_from_number, text_message)
 
     reply_message = ""
+    state_changed = False
+
+    # --- Handle RESTART command ---
+    # Handled before the state read: a reset doesn't depend on the prior state
+    if text_message == "RESTART":
+        reply_message = _RESTART_MSG
+        send_future = send_sms_reply(_get_sms(), original_from_number, reply_message) # Use original_from_number here
+        reset_user_state(db_phone_number)
+        wait_for_sms(send_future)
+        return { 'statusCode': 200, 'body': json.dumps({'message': 'Game restarted.'}) }
 
     # --- Retrieve User State from DynamoDB ---
     # Use db_phone_number for DynamoDB operations
@@ -291,157 +486,101 @@ def inbound_sms_handler(event, context):
         # Initialize new user state if not found
         current_user_state = {
             "phoneNumber": db_phone_number, # Primary key for DynamoDB (without '+')
-            "game": None,
+            "game": "",
             "status": "alive",
             "net_worth": 0,
             "days_survived": 0,
-            "current_q": None
+            "current_q": ""
         }
-        logger.info(f"New user state initialized for {db_phone_number}")
+        logger.info("New user state initialized for %s", db_phone_number)
     else:
-        logger.info(f"Loaded user state for {db_phone_number}: {current_user_state}")
-
-
-    # --- Handle RESTART command ---
-    if text_message == "RESTART":
-        current_user_state = {
-            "phoneNumber": db_phone_number, # Keep phone number for DB
-            "game": None,
-            "status": "alive",
-            "net_worth": 0,
-            "days_survived": 0,
-            "current_q": None
-        }
-        reply_message = "Welcome back! What game do you want to play?\n1. Choose Your Hustle\n2. Pick Up or Perish"
-        save_user_state(current_user_state) # Save state to DB
-        send_sms_reply(sms_service, original_from_number, reply_message) # Use original_from_number here
-        return { 'statusCode': 200, 'body': json.dumps({'message': 'Game restarted.'}) }
+        logger.info("Loaded user state for %s: %s", db_phone_number, current_user_state)
 
     # --- Initial Game Selection ---
-    if current_user_state["game"] is None:
-        if text_message == "1" or text_message == "CHOOSE YOUR HUSTLE" or text_message == "HUSTLE":
+    if not current_user_state["game"]:
+        if text_message in _GAME_START_TOKENS:
             current_user_state["game"] = "hustle"
             current_user_state["current_q"] = "hustle_intro" # Set to intro state
-            intro_data = GAME_DATA["hustle_intro"]
-            reply_message = intro_data["message"] + "\n" + "\n".join(intro_data["options"])
-            save_user_state(current_user_state) # Save state to DB
-        elif text_message == "2" or text_message == "PICK UP OR PERISH" or text_message == "PERISH":
+            reply_message = PROMPTS[current_user_state["current_q"]]
+            save_state_and_reply(db_phone_number, current_user_state, original_from_number, reply_message)
+        elif text_message in _GAME2_TOKENS:
             reply_message = "Pick Up or Perish is not ready yet. Try Choose Your Hustle (reply 1)."
+            wait_for_sms(send_sms_reply(_get_sms(), original_from_number, reply_message))
         else:
-            reply_message = "Welcome! What game do you want to play?\n1. Choose Your Hustle\n2. Pick Up or Perish"
-        send_sms_reply(sms_service, original_from_number, reply_message)
+            reply_message = _WELCOME_MSG
+            wait_for_sms(send_sms_reply(_get_sms(), original_from_number, reply_message))
         # IMPORTANT: Return immediately after game selection to prevent falling into game logic below
         return { 'statusCode': 200, 'body': json.dumps({'message': 'Game selection handled.'}) }
 
     # --- Handle In-Game Logic (Hustle) ---
-    # This block is entered if current_user_state["game"] is NOT None (i.e., a game is in progress)
+    # This block is entered if current_user_state["game"] is set (i.e., a game is in progress)
     if current_user_state["game"] == "hustle" and current_user_state["status"] == "alive":
         current_q_key = current_user_state["current_q"]
-        current_q_data = GAME_DATA.get(current_q_key)
+        current_q_data = COMPILED.get(current_q_key)
 
         # Handle 'hustle_intro' specifically, as it's a prompt for the first real choice
         if current_q_key == "hustle_intro":
-            if text_message in ["1", "2", "3"]:
+            if text_message in _VALID_CHOICES:
                 # User is making their first choice after the intro, this choice applies to hustle_q1
                 # Update current_q to hustle_q1 for the *next* round of interaction.
                 # The state is saved immediately after this part of the logic handles the input.
-                current_user_state["current_q"] = GAME_DATA["hustle_intro"]["next_state"] # Should be "hustle_q1"
-                
+                processing_q_key = current_q_data.next_state # Should be "hustle_q1"
+                current_user_state["current_q"] = processing_q_key
+
                 # Now, process this input as if it were for hustle_q1
                 # Temporarily get hustle_q1 data for processing the outcome of this turn
-                processing_q_data = GAME_DATA.get(GAME_DATA["hustle_intro"]["next_state"])
-                if not processing_q_data or "outcomes" not in processing_q_data:
+                processing_q_data = COMPILED.get(processing_q_key)
+                if not processing_q_data or processing_q_data.outcomes is None:
                     reply_message = "Error: Game setup for hustle_q1 is incorrect. Reply RESTART."
                     current_user_state["status"] = "dead"
-                    current_user_state["game"] = None
-                    current_user_state["current_q"] = None
+                    current_user_state["game"] = ""
+                    current_user_state["current_q"] = ""
                 else:
-                    outcome = processing_q_data["outcomes"].get(text_message)
+                    outcome = OUTCOME_TABLE.get((processing_q_key, text_message))
                     if outcome:
                         # Apply effects and determine next state based on hustle_q1's outcome
                         reply_message, current_user_state = apply_outcome_and_get_message(outcome, current_user_state)
-                        
-                        # After applying outcome, prepare the message for the *new* current_q
-                        if current_user_state["status"] == "alive":
-                             next_q_after_choice = GAME_DATA.get(current_user_state["current_q"])
-                             if next_q_after_choice and "options" in next_q_after_choice:
-                                reply_message += f"\n\nCurrent Net Worth: KES {current_user_state['net_worth']}\n"
-                                reply_message += next_q_after_choice["message"] + "\n"
-                                reply_message += "\n".join(next_q_after_choice["options"])
-                             elif current_user_state["current_q"] == "check_win":
-                                 # Win condition already handled within apply_outcome_and_get_message if net_worth >= GOAL
-                                 pass
-                             else: # Unexpected end of flow (e.g., ran out of questions without explicit win/loss)
-                                 reply_message += "\nUnexpected game end. Reply RESTART to start again."
-                                 current_user_state["status"] = "dead"
-                                 current_user_state["game"] = None
-                                 current_user_state["current_q"] = None
+                        reply_message = _append_next_prompt(reply_message, current_user_state)
 
                     else: # Invalid option for hustle_q1 (when current_q was hustle_intro)
-                        reply_message = "Invalid choice. Please reply with 1, 2, or 3 for your first move."
-                        intro_data = GAME_DATA["hustle_intro"] # Show intro options again
-                        reply_message += "\n" + "\n".join(intro_data["options"])
+                        # Show intro options again
+                        reply_message = "\n".join(["Invalid choice. Please reply with 1, 2, or 3 for your first move.", *current_q_data.options])
             else: # Input not 1,2,3 for hustle_intro
-                reply_message = "Please choose a valid option (1, 2, or 3) to start your hustle."
-                intro_data = GAME_DATA["hustle_intro"] # Show intro options again
-                reply_message += "\n" + "\n".join(intro_data["options"])
+                # Show intro options again
+                reply_message = "\n".join(["Please choose a valid option (1, 2, or 3) to start your hustle.", *current_q_data.options])
 
-            save_user_state(current_user_state)
-            send_sms_reply(sms_service, original_from_number, reply_message)
+            save_state_and_reply(db_phone_number, current_user_state, original_from_number, reply_message)
             return { 'statusCode': 200, 'body': json.dumps({'message': 'Hustle intro choice processed.'}) }
 
         # --- General Game Question Logic (for states with "outcomes") ---
         # This block is reached if current_q_key is NOT 'hustle_intro' (e.g., 'hustle_q1', 'hustle_q2' etc.)
-        if not current_q_data or "outcomes" not in current_q_data:
+        if not current_q_data or current_q_data.outcomes is None:
             reply_message = "Error: Invalid game state (missing outcomes for current question). Reply RESTART to begin anew."
             current_user_state["status"] = "dead"
-            current_user_state["game"] = None
-            current_user_state["current_q"] = None
-            save_user_state(current_user_state)
-            send_sms_reply(sms_service, original_from_number, reply_message)
+            current_user_state["game"] = ""
+            current_user_state["current_q"] = ""
+            save_state_and_reply(db_phone_number, current_user_state, original_from_number, reply_message)
             return { 'statusCode': 200, 'body': json.dumps({'message': 'Error in game state.'}) }
 
-        if text_message in ["1", "2", "3"]:
-            chosen_option = text_message
-            outcome = current_q_data["outcomes"].get(chosen_option)
+        if text_message in _VALID_CHOICES:
+            outcome = OUTCOME_TABLE.get((current_q_key, text_message))
 
             if outcome:
                 reply_message, current_user_state = apply_outcome_and_get_message(outcome, current_user_state)
-                
-                # After applying outcome, prepare the message for the *new* current_q
-                if current_user_state["status"] == "alive": # If still alive after outcome
-                    next_q_data = GAME_DATA.get(current_user_state["current_q"])
-                    if next_q_data and "options" in next_q_data:
-                        reply_message += f"\n\nCurrent Net Worth: KES {current_user_state['net_worth']}\n"
-                        reply_message += next_q_data["message"] + "\n"
-                        reply_message += "\n".join(next_q_data["options"])
-                    elif current_user_state["current_q"] == "check_win":
-                        # Win condition already handled within apply_outcome_and_get_message if net_worth >= GOAL
-                        pass
-                    else: # Unexpected end of flow (e.g., ran out of questions without explicit win/loss)
-                        reply_message += "\nUnexpected game end. Reply RESTART to start again."
-                        current_user_state["status"] = "dead"
-                        current_user_state["game"] = None
-                        current_user_state["current_q"] = None
-                
-                save_user_state(current_user_state)
+                reply_message = _append_next_prompt(reply_message, current_user_state)
+                state_changed = True
 
             else: # Invalid option chosen for current_q_key
-                reply_message = "Invalid choice. Please reply with 1, 2, or 3."
-                current_q = GAME_DATA.get(current_q_key)
-                if current_q and "options" in current_q:
-                     reply_message += "\n" + "\n".join(current_q["options"])
-                else:
-                     reply_message += "\nReply RESTART to begin anew."
+                reply_message = INVALID_PROMPTS.get(current_q_key, "Invalid choice. Please reply with 1, 2, or 3.\nReply RESTART to begin anew.")
 
         else: # Not a recognized command or choice for in-game
-            reply_message = "I don't understand that. Please choose an option (1, 2, 3) or reply RESTART."
-            current_q = GAME_DATA.get(current_q_key)
-            if current_q and "options" in current_q:
-                 reply_message += "\n" + "\n".join(current_q["options"])
+            reply_message = UNKNOWN_INPUT_PROMPTS.get(current_q_key, "I don't understand that. Please choose an option (1, 2, 3) or reply RESTART.")
 
 
-    send_sms_reply(sms_service, original_from_number, reply_message)
+    if state_changed:
+        save_state_and_reply(db_phone_number, current_user_state, original_from_number, reply_message)
+    else:
+        wait_for_sms(send_sms_reply(_get_sms(), original_from_number, reply_message))
     return {
         'statusCode': 200,
         'body': json.dumps({'message': 'SMS received and processed successfully!'})